@@ -10,7 +10,7 @@ def document_alerts(request):
     
     # Check if user is manager or superuser efficiently
     # Avoid group lookup if superuser
-    is_manager = request.user.is_superuser or request.user.groups.filter(name='manager').exists()
+    is_manager = request.user.is_superuser or 'manager' in request.user_roles
     if not is_manager:
         return {}
 
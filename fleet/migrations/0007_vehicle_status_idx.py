@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-16 03:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fleet', '0006_tyre_photo_alter_tyrelog_action'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(fields=['status'], name='vehicle_status_idx'),
+        ),
+    ]
@@ -57,6 +57,10 @@ class Vehicle(models.Model):
         verbose_name = 'Vehicle'
         verbose_name_plural = 'Vehicles'
         ordering = ['registration_plate']
+        indexes = [
+            # Vehicle list status filter and the dashboard's in-maintenance count
+            models.Index(fields=['status'], name='vehicle_status_idx'),
+        ]
         permissions = [
             ('can_view_all_vehicles', 'Can view all vehicles'),
         ]
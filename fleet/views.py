@@ -7,7 +7,7 @@ from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, get_object_or_404, redirect
 from django.urls import reverse_lazy
 from django.contrib import messages
-from django.db.models import Q, Count, Sum
+from django.db.models import Q, Count, Sum, ProtectedError
 from django.http import JsonResponse, HttpResponse
 
 from .models import Vehicle, MaintenanceLog, MaintenanceTask, Tyre, TyreLog
@@ -19,15 +19,15 @@ class BaseFleetPermissionMixin:
     
     def has_manager_permission(self):
         """Check if user is in manager group"""
-        return self.request.user.groups.filter(name='manager').exists()
+        return 'manager' in self.request.user_roles
     
     def has_supervisor_permission(self):
         """Check if user is in supervisor group"""
-        return self.request.user.groups.filter(name='supervisor').exists()
+        return 'supervisor' in self.request.user_roles
     
     def has_driver_permission(self):
         """Check if user is in driver group"""
-        return self.request.user.groups.filter(name='driver').exists()
+        return 'driver' in self.request.user_roles
 
 
 class MaintenanceTaskListView(LoginRequiredMixin, BaseFleetPermissionMixin, ListView):
@@ -399,9 +399,14 @@ class VehicleDeleteView(LoginRequiredMixin, PermissionRequiredMixin, DeleteView)
     permission_required = 'fleet.delete_vehicle'
     success_url = reverse_lazy('vehicle-list')
     
-    def delete(self, request, *args, **kwargs):
+    def form_valid(self, form):
+        try:
+            response = super().form_valid(form)
+        except ProtectedError:
+            messages.error(self.request, 'Cannot delete this vehicle because it has trips recorded against it.')
+            return redirect('vehicle-detail', pk=self.object.pk)
         messages.success(self.request, 'Vehicle deleted successfully!')
-        return super().delete(request, *args, **kwargs)
+        return response
 
 
 class MaintenanceLogListView(LoginRequiredMixin, BaseFleetPermissionMixin, ListView):
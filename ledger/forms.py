@@ -216,7 +216,7 @@ class BillForm(forms.ModelForm):
         if party_id:
             try:
                 # Show trips for this party
-                qs = Trip.objects.filter(party_id=party_id).exclude(status='Cancelled')
+                qs = Trip.objects.filter(party_id=party_id).exclude(status=Trip.STATUS_CANCELLED)
                 
                 if self.instance and self.instance.pk:
                     # Include currently selected trips + unbilled ones
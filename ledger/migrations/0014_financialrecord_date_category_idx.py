@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-16 03:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ledger', '0013_add_deduction_categories'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='financialrecord',
+            index=models.Index(fields=['date', 'category'], name='finrecord_date_category_idx'),
+        ),
+    ]
@@ -3,7 +3,7 @@ Models for Ledger application
 """
 from django.db import models
 from django.contrib.auth.models import User
-from trips.models import Trip
+from trips.models import Trip, revenue_expression
 from django.db.models import Sum, F, DecimalField
 from django.db.models.functions import Coalesce
 from decimal import Decimal
@@ -317,6 +317,11 @@ class FinancialRecord(models.Model):
         verbose_name = 'Financial Record'
         verbose_name_plural = 'Financial Records'
         ordering = ['-date']
+        indexes = [
+            # Date-range reports (dashboard month totals, ledger filters) that
+            # then split or exclude by category
+            models.Index(fields=['date', 'category'], name='finrecord_date_category_idx'),
+        ]
         permissions = [
             ('can_view_financial_records', 'Can view financial records'),
             ('can_manage_financial_records', 'Can manage financial records'),
@@ -696,9 +701,9 @@ class Bill(models.Model):
     def subtotal(self):
         if self.bill_type == self.TYPE_STANDARD:
             return self.amount_override or 0
-        # revenue = weight * rate_per_ton
+        # Same rule as Trip.revenue (fixed or weight * rate_per_ton), summed in SQL
         return self.trips.aggregate(
-            total=models.Sum(models.F('weight') * models.F('rate_per_ton'))
+            total=models.Sum(revenue_expression())
         )['total'] or 0
 
     @property
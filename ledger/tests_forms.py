@@ -1,7 +1,7 @@
 from django.test import TestCase
 from django.contrib.auth.models import User
 from django.utils import timezone
-from .forms import FinancialRecordForm
+from .forms import FinancialRecordForm, BillForm
 from .models import Party
 from trips.models import Trip
 from fleet.models import Vehicle
@@ -27,6 +27,13 @@ class FinancialRecordFormTest(TestCase):
             status='Active',
             purchase_date=timezone.now().date()
         )
+        # A vehicle can only carry one uncompleted trip at a time
+        self.vehicle2 = Vehicle.objects.create(
+            registration_plate='V2', 
+            make_model='M1', 
+            status='Active',
+            purchase_date=timezone.now().date()
+        )
         
         # Trip for Party 1
         self.trip1 = Trip.objects.create(
@@ -50,7 +57,7 @@ class FinancialRecordFormTest(TestCase):
         # Trip for Party 2
         self.trip2 = Trip.objects.create(
             driver=self.driver_profile,
-            vehicle=self.vehicle, 
+            vehicle=self.vehicle2, 
             party=self.party2,
             created_by=self.user,
             date=timezone.now()
@@ -72,4 +79,26 @@ class FinancialRecordFormTest(TestCase):
         # Check that queryset only contains trip1
         queryset = form.fields['associated_trip'].queryset
         self.assertIn(self.trip1, queryset)
-        self.assertNotIn(self.trip2, queryset)
\ No newline at end of file
+        self.assertNotIn(self.trip2, queryset)
+
+    def test_bill_form_lists_unbilled_trips_for_party(self):
+        vehicle3 = Vehicle.objects.create(
+            registration_plate='V3',
+            make_model='M1',
+            status='Active',
+            purchase_date=timezone.now().date()
+        )
+        cancelled = Trip.objects.create(
+            driver=self.driver_profile,
+            vehicle=vehicle3,
+            party=self.party2,
+            created_by=self.user,
+            date=timezone.now(),
+            status=Trip.STATUS_CANCELLED
+        )
+        form = BillForm(initial={'party': self.party2.pk})
+
+        queryset = form.fields['trips'].queryset
+        self.assertIn(self.trip2, queryset)
+        self.assertNotIn(cancelled, queryset)
+        self.assertNotIn(self.trip1, queryset)
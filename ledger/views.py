@@ -11,7 +11,7 @@ from django.db.models import Q, Sum, F, DecimalField, Value, Case, When, OuterRe
 from django.db.models.functions import Coalesce
 from django.utils import timezone
 from decimal import Decimal, InvalidOperation
-from datetime import datetime
+from datetime import date, datetime, timedelta
 import json
 from django.http import JsonResponse, HttpResponse
 from django.template.loader import get_template
@@ -29,15 +29,15 @@ class BaseLedgerPermissionMixin:
     
     def has_manager_permission(self):
         """Check if user is in manager group"""
-        return self.request.user.groups.filter(name='manager').exists()
+        return 'manager' in self.request.user_roles
     
     def has_supervisor_permission(self):
         """Check if user is in supervisor group"""
-        return self.request.user.groups.filter(name='supervisor').exists()
+        return 'supervisor' in self.request.user_roles
     
     def has_driver_permission(self):
         """Check if user is in driver group"""
-        return self.request.user.groups.filter(name='driver').exists()
+        return 'driver' in self.request.user_roles
 
 
 class FinancialRecordListView(LoginRequiredMixin, BaseLedgerPermissionMixin, ListView):
@@ -281,40 +281,50 @@ def financial_summary(request):
     current_month = now.month
     current_year = now.year
     
+    # Half-open ranges compare the raw date column (and can use its index)
+    # instead of extracting month/year from every row
+    month_start = now.date().replace(day=1)
+    next_month_start = (month_start + timedelta(days=32)).replace(day=1)
+    year_start = date(current_year, 1, 1)
+    next_year_start = date(current_year + 1, 1, 1)
+    
     # Month calculations
     monthly_income = FinancialRecord.objects.filter(
         category__type=TransactionCategory.TYPE_INCOME,
-        date__month=current_month,
-        date__year=current_year
+        date__gte=month_start,
+        date__lt=next_month_start
     ).aggregate(total=Sum('amount'))['total'] or 0
     
     monthly_expenses = FinancialRecord.objects.filter(
         category__type=TransactionCategory.TYPE_EXPENSE,
-        date__month=current_month,
-        date__year=current_year
+        date__gte=month_start,
+        date__lt=next_month_start
     ).aggregate(total=Sum('amount'))['total'] or 0
     
     # Year calculations
     yearly_income = FinancialRecord.objects.filter(
         category__type=TransactionCategory.TYPE_INCOME,
-        date__year=current_year
+        date__gte=year_start,
+        date__lt=next_year_start
     ).aggregate(total=Sum('amount'))['total'] or 0
     
     yearly_expenses = FinancialRecord.objects.filter(
         category__type=TransactionCategory.TYPE_EXPENSE,
-        date__year=current_year
+        date__gte=year_start,
+        date__lt=next_year_start
     ).aggregate(total=Sum('amount'))['total'] or 0
 
     # Calculate GST portion from Final Bills
     from .models import Bill
     monthly_gst = sum(bill.gst_amount for bill in Bill.objects.filter(
         status=Bill.STATUS_FINAL,
-        date__month=current_month,
-        date__year=current_year
+        date__gte=month_start,
+        date__lt=next_month_start
     ))
     yearly_gst = sum(bill.gst_amount for bill in Bill.objects.filter(
         status=Bill.STATUS_FINAL,
-        date__year=current_year
+        date__gte=year_start,
+        date__lt=next_year_start
     ))
     
     # Category breakdown for current month
@@ -322,8 +332,8 @@ def financial_summary(request):
     for cat in TransactionCategory.objects.all():
         total = FinancialRecord.objects.filter(
             category=cat,
-            date__month=current_month,
-            date__year=current_year
+            date__gte=month_start,
+            date__lt=next_month_start
         ).aggregate(total=Sum('amount'))['total'] or 0
         if total > 0:
             category_breakdown.append({
@@ -653,7 +663,7 @@ def get_party_unbilled_trips(request):
     
     try:
         # Show trips for this party
-        qs = Trip.objects.filter(party_id=party_id).exclude(status='Cancelled')
+        qs = Trip.objects.filter(party_id=party_id).exclude(status=Trip.STATUS_CANCELLED)
         
         if bill_id:
             # Include currently selected trips for this bill + unbilled ones
@@ -829,10 +839,10 @@ def print_combined_bill(request, pk):
     # For annexure
     bill_trips = bill.bill_trips.select_related('trip', 'trip__vehicle').order_by('trip__date')
     date_groups = []
-    for date, group in groupby(bill_trips, key=lambda bt: bt.trip.date.date()):
+    for day, group in groupby(bill_trips, key=lambda bt: bt.trip.date.date()):
         bt_list = list(group)
         date_groups.append({
-            'date': date,
+            'date': day,
             'bill_trips': bt_list,
             'total_weight': sum(bt.trip.weight or 0 for bt in bt_list),
             'total_amount': sum(bt.trip.revenue or 0 for bt in bt_list),
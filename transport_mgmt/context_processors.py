@@ -0,0 +1,8 @@
+"""
+Project-wide template context processors
+"""
+
+
+def user_roles(request):
+    """Expose request.user_roles so templates can check roles without querying groups"""
+    return {'user_roles': getattr(request, 'user_roles', frozenset())}
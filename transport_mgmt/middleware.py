@@ -0,0 +1,26 @@
+"""
+Project-wide middleware
+"""
+from django.utils.functional import SimpleLazyObject
+
+
+def get_user_roles(user):
+    """Names of the groups the user belongs to"""
+    if not user.is_authenticated:
+        return frozenset()
+    return frozenset(user.groups.values_list('name', flat=True))
+
+
+class UserRolesMiddleware:
+    """
+    Attach request.user_roles, the set of group names of the current user.
+    It is evaluated on first use and then shared by every view, mixin and
+    context processor for the rest of the request, so role checks cost a
+    single groups query at most.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.user_roles = SimpleLazyObject(lambda: get_user_roles(request.user))
+        return self.get_response(request)
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-16 02:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0005_trip_revenue_type'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(condition=models.Q(('status', 'Completed'), _negated=True), fields=['vehicle', 'status'], name='trip_active_idx'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-16 02:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# The rule was previously only checked in Trip.clean(), which create()/save()
+# and status reopening bypass, so existing data can already break it. Rather
+# than guess which trip should give way (completing or cancelling one has
+# ledger side effects), stop and name the trips to fix by hand.
+def check_one_active_trip_per_vehicle(apps, schema_editor):
+    Trip = apps.get_model('trips', 'Trip')
+    open_trips = Trip.objects.exclude(status='Completed')
+    vehicle_ids = (
+        open_trips.values('vehicle')
+        .annotate(open_count=models.Count('pk'))
+        .filter(open_count__gt=1)
+        .values_list('vehicle', flat=True)
+    )
+    conflicts = {}
+    for trip in open_trips.filter(vehicle__in=vehicle_ids).select_related('vehicle').order_by('vehicle', 'date'):
+        conflicts.setdefault(trip.vehicle.registration_plate, []).append(
+            trip.trip_number or f'#{trip.pk}'
+        )
+    if conflicts:
+        lines = '\n'.join(
+            f'  {plate}: {", ".join(trip_numbers)}' for plate, trip_numbers in sorted(conflicts.items())
+        )
+        raise RuntimeError(
+            'Cannot add the one_active_trip_per_vehicle constraint: these vehicles '
+            'have more than one trip that is not Completed (Cancelled trips count '
+            'too). Mark all but one of each as Completed, then migrate again.\n' + lines
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fleet', '0006_tyre_photo_alter_tyrelog_action'),
+        ('trips', '0006_trip_active_idx'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='trip',
+            name='trip_active_idx',
+        ),
+        migrations.AlterField(
+            model_name='trip',
+            name='vehicle',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='trips', to='fleet.vehicle', verbose_name='Assigned Vehicle'),
+        ),
+        migrations.RunPython(check_one_active_trip_per_vehicle, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='trip',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'Completed'), _negated=True), fields=('vehicle',), name='one_active_trip_per_vehicle', violation_error_message='This vehicle already has an uncompleted trip. Please mark the old trip as completed first.'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+# Trigram GIN indexes let the autocomplete endpoint's icontains lookups
+# (ILIKE '%term%') use an index instead of scanning every trip. pg_trgm only
+# exists on PostgreSQL, so other backends (e.g. the default SQLite) skip this.
+TRGM_INDEXES = [
+    ('trip_pickup_trgm', 'trips_trip', 'pickup_location'),
+    ('trip_delivery_trgm', 'trips_trip', 'delivery_location'),
+]
+
+def create_trgm_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, column in TRGM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ({column} gin_trgm_ops)'
+        )
+
+def drop_trgm_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    for name, table, column in TRGM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0007_one_active_trip_per_vehicle'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trgm_indexes, drop_trgm_indexes),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-16 02:59
+
+from django.db import migrations, models
+
+# Old status labels -> new integer codes (see trips.models.TripStatus)
+STATUS_CODES = {
+    'In Progress': '1',
+    'Completed': '2',
+    'Cancelled': '3',
+}
+
+def status_labels_to_codes(apps, schema_editor):
+    Trip = apps.get_model('trips', 'Trip')
+    for label, code in STATUS_CODES.items():
+        Trip.objects.filter(status=label).update(status=code)
+
+def status_codes_to_labels(apps, schema_editor):
+    Trip = apps.get_model('trips', 'Trip')
+    for label, code in STATUS_CODES.items():
+        Trip.objects.filter(status=code).update(status=label)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0008_trip_location_trgm_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='trip',
+            name='one_active_trip_per_vehicle',
+        ),
+        # Rewrite the labels as numeric strings while the column is still text,
+        # so the type change below is a plain cast
+        migrations.RunPython(status_labels_to_codes, status_codes_to_labels),
+        migrations.AlterField(
+            model_name='trip',
+            name='status',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'In Progress'), (2, 'Completed'), (3, 'Cancelled')], default=1, verbose_name='Trip Status'),
+        ),
+        migrations.AddConstraint(
+            model_name='trip',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 2), _negated=True), fields=('vehicle',), name='one_active_trip_per_vehicle', violation_error_message='This vehicle already has an uncompleted trip. Please mark the old trip as completed first.'),
+        ),
+    ]
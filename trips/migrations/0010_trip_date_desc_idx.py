@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-16 03:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0009_trip_status_integer'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['-date', '-created_at'], name='trip_date_desc_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-16 03:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0011_tripexpense_name_trgm_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['status', 'date'], name='trip_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['status', 'actual_completion_datetime'], name='trip_status_completed_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-16 03:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0012_trip_status_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['driver', '-date'], name='trip_driver_date_idx'),
+        ),
+    ]
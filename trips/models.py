@@ -5,7 +5,8 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.core.exceptions import ValidationError
-from django.db.models.signals import post_delete
+from django.db.models.signals import post_delete, post_save
+from django.core.cache import cache
 from django.dispatch import receiver
 from django.db.models import Sum, Case, When, Value, F, DecimalField, OuterRef, Subquery
 from django.db.models.functions import Coalesce
@@ -15,6 +16,27 @@ import re
 
 from django.db.models import Sum, Case, When, Value, F, DecimalField
 
+ACTIVE_TRIP_EXISTS_MESSAGE = (
+    "This vehicle already has an uncompleted trip. "
+    "Please mark the old trip as completed first."
+)
+
+def revenue_expression():
+    """SQL equivalent of Trip.revenue, for annotations and aggregates"""
+    return Case(
+        When(revenue_type='fixed', then=F('rate_per_ton')),
+        default=F('weight') * F('rate_per_ton'),
+        # weight and rate_per_ton have 2 decimal places each, so their product
+        # needs 4 to match Trip.revenue exactly
+        output_field=DecimalField(max_digits=20, decimal_places=4)
+    )
+
+class TripStatus(models.IntegerChoices):
+    """Trip status, stored as a small integer so filters and indexes compare 2-byte keys"""
+    IN_PROGRESS = 1, 'In Progress'
+    COMPLETED = 2, 'Completed'
+    CANCELLED = 3, 'Cancelled'
+
 class TripQuerySet(models.QuerySet):
     def with_payment_info(self):
         """Annotate queryset with payment information for filtering and sorting"""
@@ -38,11 +60,7 @@ class TripQuerySet(models.QuerySet):
         return self.annotate(
             annotated_received = Coalesce(Subquery(direct_payments), Value(0), output_field=DecimalField()) + 
                                  Coalesce(Subquery(allocations), Value(0), output_field=DecimalField()),
-            annotated_revenue = Case(
-                When(revenue_type='fixed', then=F('rate_per_ton')),
-                default=F('weight') * F('rate_per_ton'),
-                output_field=DecimalField()
-            )
+            annotated_revenue = revenue_expression()
         ).annotate(
             annotated_status = Case(
                 When(annotated_received__gte=F('annotated_revenue'), annotated_revenue__gt=0, then=Value('Paid')),
@@ -84,15 +102,16 @@ class Trip(models.Model):
     """
     
     # Status choices
-    STATUS_IN_PROGRESS = 'In Progress'
-    STATUS_COMPLETED = 'Completed'
-    STATUS_CANCELLED = 'Cancelled'
+    Status = TripStatus
+    STATUS_IN_PROGRESS = TripStatus.IN_PROGRESS
+    STATUS_COMPLETED = TripStatus.COMPLETED
+    STATUS_CANCELLED = TripStatus.CANCELLED
     
-    STATUS_CHOICES = [
-        (STATUS_IN_PROGRESS, 'In Progress'),
-        (STATUS_COMPLETED, 'Completed'),
-        (STATUS_CANCELLED, 'Cancelled'),
-    ]
+    STATUS_CHOICES = TripStatus.choices
+
+    # Fields whose partial save() must re-run trip numbering / fuel log sync
+    NUMBERING_FIELDS = frozenset(['vehicle', 'trip_number'])
+    FUEL_LOG_FIELDS = frozenset(['diesel_liters', 'diesel_total_cost', 'diesel_rate', 'date', 'vehicle', 'start_odometer'])
     
     # Payment Status
     PAYMENT_STATUS_UNPAID = 'Unpaid'
@@ -143,7 +162,7 @@ class Trip(models.Model):
     # Vehicle assignment (ForeignKey to Vehicle)
     vehicle = models.ForeignKey(
         Vehicle,
-        on_delete=models.CASCADE,
+        on_delete=models.PROTECT,
         related_name='trips',
         verbose_name='Assigned Vehicle'
     )
@@ -239,8 +258,7 @@ class Trip(models.Model):
     )
     
     # Status with choices
-    status = models.CharField(
-        max_length=20,
+    status = models.PositiveSmallIntegerField(
         choices=STATUS_CHOICES,
         default=STATUS_IN_PROGRESS,
         verbose_name='Trip Status'
@@ -270,6 +288,25 @@ class Trip(models.Model):
         verbose_name = 'Trip'
         verbose_name_plural = 'Trips'
         ordering = ['-date', '-created_at']
+        indexes = [
+            # Matches the default ordering so paginated lists can walk the index
+            models.Index(fields=['-date', '-created_at'], name='trip_date_desc_idx'),
+            # Status filters on the list and dashboard; status leads, so these
+            # also serve plain status lookups
+            models.Index(fields=['status', 'date'], name='trip_status_date_idx'),
+            models.Index(fields=['status', 'actual_completion_datetime'], name='trip_status_completed_idx'),
+            # Drivers only ever list their own trips, newest first
+            models.Index(fields=['driver', '-date'], name='trip_driver_date_idx'),
+        ]
+        constraints = [
+            # A vehicle can only have one uncompleted trip at a time
+            models.UniqueConstraint(
+                fields=['vehicle'],
+                condition=~models.Q(status=TripStatus.COMPLETED),
+                name='one_active_trip_per_vehicle',
+                violation_error_message=ACTIVE_TRIP_EXISTS_MESSAGE
+            ),
+        ]
         permissions = [
             ('can_view_all_trips', 'Can view all trips'),
             ('can_update_trip_status', 'Can update trip status'),
@@ -283,38 +320,10 @@ class Trip(models.Model):
     
     def clean(self):
         """
-        Validate trip logic
+        Validate trip logic.
+        The one-uncompleted-trip-per-vehicle rule is enforced by the
+        'one_active_trip_per_vehicle' constraint in Meta.
         """
-        # Check if we are adding a new trip or changing the vehicle of an existing trip
-        check_vehicle = False
-        if self._state.adding:
-            check_vehicle = True
-        else:
-            try:
-                old_instance = Trip.objects.get(pk=self.pk)
-                if old_instance.vehicle != self.vehicle:
-                    check_vehicle = True
-            except Trip.DoesNotExist:
-                check_vehicle = True
-                
-        if check_vehicle and self.vehicle:
-            # Check if there are any uncompleted trips for this vehicle
-            uncompleted_trips = Trip.objects.filter(
-                vehicle=self.vehicle
-            ).exclude(status=self.STATUS_COMPLETED)
-            
-            if not self._state.adding:
-                uncompleted_trips = uncompleted_trips.exclude(pk=self.pk)
-            
-            if uncompleted_trips.exists():
-                latest_uncompleted = uncompleted_trips.order_by('-date').first()
-                trip_num = latest_uncompleted.trip_number or "Unknown"
-                raise ValidationError(
-                    f"Cannot create or assign a trip to vehicle {self.vehicle.registration_plate} "
-                    f"because it has an uncompleted trip ({trip_num}). "
-                    "Please mark the old trip as completed first."
-                )
-
         if self.start_odometer is not None and self.end_odometer is not None:
             if self.end_odometer < self.start_odometer:
                 # Raising as a non-field error (string) to prevent ValueError 
@@ -422,13 +431,22 @@ class Trip(models.Model):
         if not is_new:
             old_instance = Trip.objects.get(pk=self.pk)
 
+        # Single timestamp for completion time and numbering
+        now = timezone.now()
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'status' in update_fields:
+            # The completion datetime is derived from status and must be written with it
+            update_fields = set(update_fields) | {'actual_completion_datetime'}
+            kwargs['update_fields'] = update_fields
+
         # 1. Start Odometer Logic: Default to vehicle's current odometer on creation
         if is_new and not self.start_odometer:
             self.start_odometer = self.vehicle.current_odometer
 
         # 2. Status logic: Handle completion datetime
         if self.status == self.STATUS_COMPLETED and not self.actual_completion_datetime:
-            self.actual_completion_datetime = timezone.now()
+            self.actual_completion_datetime = now
         elif self.status != self.STATUS_COMPLETED:
             self.actual_completion_datetime = None
 
@@ -443,38 +461,43 @@ class Trip(models.Model):
                 if liters > 0:
                     self.diesel_rate = Decimal(str(self.diesel_total_cost)) / liters
 
-        # Handle Trip Number generation and regeneration
-        reg_plate = self.vehicle.registration_plate
+        # Handle Trip Number generation and regeneration.
+        # Partial saves (e.g. status toggles) that touch neither the vehicle nor the
+        # number skip this entirely, since the result would not be written anyway.
+        if update_fields is None or not self.NUMBERING_FIELDS.isdisjoint(update_fields):
+            reg_plate = self.vehicle.registration_plate
         
-        # If trip exists, check if vehicle changed
-        if not is_new:
-            if old_instance.vehicle != self.vehicle:
-                # Vehicle changed, clear trip_number to trigger regeneration
-                self.trip_number = ""
-
-        # Generate Trip Number if not present or cleared
-        if not self.trip_number:
-            from ledger.models import Sequence
-
-            # Use created_at if available (for re-numbering), else current time
-            ref_date = self.created_at or timezone.now()
+            # If trip exists, check if vehicle changed (compare ids so the old
+            # instance's vehicle is never loaded)
+            if not is_new:
+                if old_instance.vehicle_id != self.vehicle_id:
+                    # Vehicle changed, clear trip_number to trigger regeneration
+                    self.trip_number = ""
+
+            # Generate Trip Number if not present or cleared
+            if not self.trip_number:
+                from ledger.models import Sequence
+
+                # Use created_at if available (for re-numbering), else current time
+                ref_date = self.created_at or now
             
-            # Using Sequences for robust atomic numbering
-            total_count = Sequence.next_value(f"trip_total_{self.vehicle.pk}")
-            month_count = Sequence.next_value(f"trip_month_{self.vehicle.pk}_{ref_date.year}_{ref_date.month}")
-            year_count = Sequence.next_value(f"trip_year_{self.vehicle.pk}_{ref_date.year}")
+                # Using Sequences for robust atomic numbering
+                vehicle_id = self.vehicle_id
+                total_count = Sequence.next_value(f"trip_total_{vehicle_id}")
+                month_count = Sequence.next_value(f"trip_month_{vehicle_id}_{ref_date.year}_{ref_date.month}")
+                year_count = Sequence.next_value(f"trip_year_{vehicle_id}_{ref_date.year}")
             
-            self.trip_number = f"{reg_plate}-{total_count}/{month_count}/{year_count}"
+                self.trip_number = f"{reg_plate}-{total_count}/{month_count}/{year_count}"
         
-        # If trip_number already exists but vehicle plate changed (manual correction)
-        # ensure the prefix matches the current plate
-        elif not self.trip_number.startswith(reg_plate):
-            parts = self.trip_number.rsplit('-', 1)
-            if len(parts) > 1:
-                last_dash_idx = self.trip_number.rfind('-')
-                if last_dash_idx != -1:
-                    suffix = self.trip_number[last_dash_idx+1:]
-                    self.trip_number = f"{reg_plate}-{suffix}"
+            # If trip_number already exists but vehicle plate changed (manual correction)
+            # ensure the prefix matches the current plate
+            elif not self.trip_number.startswith(reg_plate):
+                parts = self.trip_number.rsplit('-', 1)
+                if len(parts) > 1:
+                    last_dash_idx = self.trip_number.rfind('-')
+                    if last_dash_idx != -1:
+                        suffix = self.trip_number[last_dash_idx+1:]
+                        self.trip_number = f"{reg_plate}-{suffix}"
 
         # Perform the actual save
         super().save(*args, **kwargs)
@@ -525,16 +548,17 @@ class Trip(models.Model):
         self.sync_ledger_invoice()
 
         # Sync Fuel Log
-        update_fields = kwargs.get('update_fields')
-        if update_fields is None or any(f in update_fields for f in ['diesel_liters', 'diesel_total_cost', 'diesel_rate', 'date', 'vehicle', 'start_odometer']):
+        if update_fields is None or not self.FUEL_LOG_FIELDS.isdisjoint(update_fields):
             self.sync_fuel_log()
 
         if is_new:
-            # Create default TripExpense entries using update_or_create to avoid duplicates 
-            # if multiple saves happen in a transaction (like in unified views)
-            TripExpense.objects.update_or_create(trip=self, name='Diesel', defaults={'amount': self.diesel_total_cost or 0})
-            TripExpense.objects.update_or_create(trip=self, name='Toll', defaults={'amount': 0})
-        else:
+            # Create default TripExpense entries in a single INSERT. ignore_conflicts avoids
+            # duplicates if multiple saves happen in a transaction (like in unified views)
+            TripExpense.objects.bulk_create([
+                TripExpense(trip=self, name='Diesel', amount=self.diesel_total_cost or 0),
+                TripExpense(trip=self, name='Toll', amount=0),
+            ], ignore_conflicts=True)
+        elif update_fields is None or 'diesel_total_cost' in update_fields:
             # Update Diesel expense if total_cost changed
             TripExpense.objects.update_or_create(
                 trip=self, name='Diesel', 
@@ -635,7 +659,8 @@ class Trip(models.Model):
             return
 
         # 2. Date Check (Must be in past)
-        if self.date > timezone.now():
+        now = timezone.now()
+        if self.date > now:
             return
 
         # 3. Paid Amount
@@ -648,7 +673,7 @@ class Trip(models.Model):
         if received >= total_rev or is_bill_paid:
             self.status = self.STATUS_COMPLETED
             if not self.actual_completion_datetime:
-                self.actual_completion_datetime = timezone.now()
+                self.actual_completion_datetime = now
             self.save(update_fields=['status', 'actual_completion_datetime'])
 
     @property
@@ -777,3 +802,36 @@ def delete_related_fuel_log(sender, instance, **kwargs):
     from fleet.models import FuelLog
     FuelLog.objects.filter(trip=instance).delete()
 
+# Autocomplete suggestions are cached under this version; any change to the
+# trips or expenses they are drawn from moves every cached entry aside
+AUTOCOMPLETE_CACHE_VERSION_KEY = 'autocomplete_version'
+
+def autocomplete_cache_version():
+    """Current autocomplete cache version (created on first use)"""
+    return cache.get_or_set(AUTOCOMPLETE_CACHE_VERSION_KEY, 1, None)
+
+@receiver([post_save, post_delete], sender=Trip)
+@receiver([post_save, post_delete], sender=TripExpense)
+def bump_autocomplete_cache_version(sender, **kwargs):
+    """Invalidate cached autocomplete suggestions"""
+    cache.add(AUTOCOMPLETE_CACHE_VERSION_KEY, 1, None)
+    cache.incr(AUTOCOMPLETE_CACHE_VERSION_KEY)
+
+# The manager dashboard caches its figures per month (see
+# trips.views.manager_dashboard); a change to anything it summarises drops
+# the current month's entry. The timeout bounds the date-relative figures.
+DASHBOARD_CACHE_TIMEOUT = 300
+
+def dashboard_cache_key(month):
+    """Cache key for the manager dashboard figures of the month containing `month`"""
+    return f'manager_dashboard:{month:%Y-%m}'
+
+@receiver([post_save, post_delete], sender=Trip)
+@receiver([post_save, post_delete], sender='fleet.Vehicle')
+@receiver([post_save, post_delete], sender='fleet.MaintenanceLog')
+@receiver([post_save, post_delete], sender='ledger.FinancialRecord')
+@receiver([post_save, post_delete], sender='ledger.Bill')
+@receiver([post_save, post_delete], sender='ledger.BillTrip')
+def invalidate_dashboard_cache(sender, **kwargs):
+    """Drop the cached manager dashboard figures for the current month"""
+    cache.delete(dashboard_cache_key(timezone.localdate()))
@@ -1,7 +1,13 @@
-from django.test import TestCase, Client
-from django.contrib.auth.models import User, Permission
+from django.test import TestCase, TransactionTestCase, Client
+from django.db import IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.db.migrations.executor import MigrationExecutor
+from django.contrib.auth.models import User, Permission, Group
 from django.urls import reverse
 from django.utils import timezone
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 from fleet.models import Vehicle
 from trips.models import Trip, TripExpense
 from ledger.models import Party
@@ -68,6 +74,16 @@ class TripExpenseTest(TestCase):
         self.assertEqual(toll.amount, 100)
         self.assertEqual(self.trip.total_cost, 600)
 
+    def test_fixed_expenses_query_count(self):
+        url = reverse('trip-expense-update', args=[self.trip.pk])
+        # Session, user, two permission lookups, the trip, the current amounts,
+        # then inside the savepoint: one expense upsert, one trip UPDATE and
+        # the fuel log sync
+        with self.assertNumQueries(11):
+            self.client.post(url, {'diesel_expense': 500, 'toll_expense': 100})
+        self.trip.refresh_from_db()
+        self.assertEqual(self.trip.diesel_total_cost, 500)
+
     def test_custom_expenses(self):
         # Add fixed expenses first
         TripExpense.objects.update_or_create(
@@ -102,6 +118,23 @@ class TripExpenseTest(TestCase):
 
         self.assertFalse(TripExpense.objects.filter(pk=expense.pk).exists())
 
+    def test_manage_expenses_invalid_formset_keeps_errors(self):
+        url = reverse('trip-expenses-manage', args=[self.trip.pk])
+        data = {
+            'custom_expenses-TOTAL_FORMS': '1',
+            'custom_expenses-INITIAL_FORMS': '0',
+            'custom_expenses-0-name': 'Parking',
+            'custom_expenses-0-amount': 'abc',
+        }
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['expense_formset'].errors[0])
+
+        data['custom_expenses-0-amount'] = '40'
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(TripExpense.objects.filter(trip=self.trip, name='Parking', amount=40).exists())
+
     def test_revenue_types(self):
         """Test calculation logic for Per Ton vs Fixed revenue types"""
         # 1. Default: Per Ton (weight=10, rate=100)
@@ -113,9 +146,284 @@ class TripExpenseTest(TestCase):
         self.trip.rate_per_ton = 1500
         self.trip.save()
         self.assertEqual(self.trip.revenue, 1500)
+        annotated = Trip.objects.with_payment_info().get(pk=self.trip.pk)
+        self.assertEqual(annotated.annotated_revenue, 1500)
 
         # 3. Change back to Per Ton
         self.trip.revenue_type = Trip.REVENUE_PER_TON
         self.trip.rate_per_ton = 100
         self.trip.save()
-        self.assertEqual(self.trip.revenue, 1000)
\ No newline at end of file
+        self.assertEqual(self.trip.revenue, 1000)
+
+    def test_annotated_revenue_matches_revenue_property(self):
+        self.trip.weight = Decimal('10.25')
+        self.trip.rate_per_ton = Decimal('99.99')
+        self.trip.save()
+        self.trip.refresh_from_db()
+
+        annotated = Trip.objects.with_payment_info().get(pk=self.trip.pk)
+        self.assertEqual(self.trip.revenue, Decimal('1024.8975'))
+        self.assertEqual(annotated.annotated_revenue, self.trip.revenue)
+
+
+class TripViewTestCase(TestCase):
+    """
+    One logged-in user with a driver profile and one in-progress trip.
+    Subclasses list the groups and permissions their views need.
+    """
+    roles = []
+    permissions = []
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='tester', password='password')
+        for role in self.roles:
+            self.user.groups.add(Group.objects.create(name=role))
+        self.user.user_permissions.add(*Permission.objects.filter(codename__in=self.permissions))
+
+        self.driver_profile = Driver.objects.create(
+            user=self.user,
+            employee_id='D001',
+            license_number='LIC123',
+            phone_number='1234567890'
+        )
+        self.vehicle = Vehicle.objects.create(
+            registration_plate='TEST-002',
+            make_model='Test Truck 2',
+            purchase_date=timezone.now().date(),
+            status=Vehicle.STATUS_ACTIVE
+        )
+        self.party = Party.objects.create(name='Test Party')
+        self.trip = Trip.objects.create(
+            driver=self.driver_profile,
+            vehicle=self.vehicle,
+            party=self.party,
+            weight=10,
+            rate_per_ton=100,
+            date=timezone.now(),
+            status=Trip.STATUS_IN_PROGRESS,
+            created_by=self.user
+        )
+        self.client.login(username='tester', password='password')
+
+
+class TripStatusTest(TripViewTestCase):
+    """Saving trips and changing their status"""
+    roles = ['manager']
+    permissions = ['change_trip']
+
+    def test_one_uncompleted_trip_per_vehicle(self):
+        """A vehicle cannot carry a second uncompleted trip"""
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                Trip.objects.create(vehicle=self.vehicle, party=self.party, created_by=self.user)
+
+        # Once the first trip is completed the vehicle is free again
+        self.trip.status = Trip.STATUS_COMPLETED
+        self.trip.save()
+        Trip.objects.create(vehicle=self.vehicle, party=self.party, created_by=self.user)
+        self.assertEqual(self.vehicle.trips.count(), 2)
+
+    def test_other_integrity_errors_are_not_reported_as_vehicle_conflicts(self):
+        url = reverse('trip-update', args=[self.trip.pk])
+        data = {
+            'vehicle': self.vehicle.pk,
+            'driver': self.driver_profile.pk,
+            'party': self.party.pk,
+            'revenue_type': self.trip.revenue_type,
+            'weight': 10,
+            'rate_per_ton': 100,
+            'custom_expenses-TOTAL_FORMS': '1',
+            'custom_expenses-INITIAL_FORMS': '0',
+            'custom_expenses-0-name': 'Parking',
+            'custom_expenses-0-amount': '40',
+        }
+        error = IntegrityError('UNIQUE constraint failed: trips_tripexpense.trip_id, trips_tripexpense.name')
+        with mock.patch.object(TripExpense.objects, 'update_or_create', side_effect=error):
+            with self.assertRaises(IntegrityError):
+                self.client.post(url, data)
+
+    def test_update_trip_status(self):
+        """Status view marks the trip completed and stamps the completion time"""
+        url = reverse('trip-status-update', args=[self.trip.pk])
+        response = self.client.post(url, {'status': Trip.STATUS_COMPLETED})
+        self.assertEqual(response.status_code, 302)
+
+        self.trip.refresh_from_db()
+        self.assertEqual(self.trip.status, Trip.STATUS_COMPLETED)
+        self.assertIsNotNone(self.trip.actual_completion_datetime)
+
+
+class TripListViewTest(TripViewTestCase):
+    """Trip list filtering and pagination"""
+    roles = ['manager']
+
+    def test_trip_list_query_count_is_constant(self):
+        url = reverse('trip-list')
+
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(url)
+
+        # More rows on the page must not mean more queries
+        vehicle = Vehicle.objects.create(
+            registration_plate='TEST-003',
+            make_model='Test Truck 3',
+            purchase_date=timezone.now().date(),
+            status=Vehicle.STATUS_ACTIVE
+        )
+        Trip.objects.create(
+            driver=self.driver_profile,
+            vehicle=vehicle,
+            party=self.party,
+            weight=5,
+            rate_per_ton=100,
+            date=timezone.now(),
+            created_by=self.user
+        )
+        with self.assertNumQueries(len(ctx.captured_queries)):
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['trips']), 2)
+
+    def test_trip_list_cursor_pagination(self):
+        for i in range(30):
+            Trip.objects.create(
+                driver=self.driver_profile,
+                vehicle=self.vehicle,
+                party=self.party,
+                weight=i,
+                rate_per_ton=100,
+                date=timezone.now() - timedelta(days=i % 3),
+                status=Trip.STATUS_COMPLETED,
+                created_by=self.user
+            )
+        url = reverse('trip-list')
+
+        first = self.client.get(url)
+        offset_page = self.client.get(url, {'page': 2})
+        cursor_page = self.client.get(url + '?' + first.context['next_cursor_query'])
+
+        self.assertEqual(
+            [t.pk for t in cursor_page.context['trips']],
+            [t.pk for t in offset_page.context['trips']],
+        )
+        self.assertEqual(cursor_page.context['total_count'], 31)
+        self.assertEqual(cursor_page.context['total_weight'], first.context['total_weight'])
+        self.assertNotIn('next_cursor_query', cursor_page.context)
+
+    def test_trip_list_date_range_includes_end_date(self):
+        url = reverse('trip-list')
+        today = timezone.localdate(self.trip.date).isoformat()
+        yesterday = (timezone.localdate(self.trip.date) - timedelta(days=1)).isoformat()
+
+        response = self.client.get(url, {'start_date': today, 'end_date': today})
+        self.assertEqual([t.pk for t in response.context['trips']], [self.trip.pk])
+
+        response = self.client.get(url, {'end_date': yesterday})
+        self.assertEqual(list(response.context['trips']), [])
+
+
+class AutocompleteTest(TripViewTestCase):
+    """Autocomplete suggestions endpoint"""
+
+    def test_autocomplete_cache_invalidated_on_trip_save(self):
+        url = reverse('autocomplete-suggestions')
+        params = {'field': 'pickup_location', 'term': 'Pune'}
+
+        response = self.client.get(url, params)
+        self.assertEqual(response.json()['results'], [])
+
+        self.trip.pickup_location = 'Pune Depot'
+        self.trip.save()
+
+        response = self.client.get(url, params)
+        self.assertEqual([r['id'] for r in response.json()['results']], ['Pune Depot'])
+
+    def test_autocomplete_unknown_field_skips_cache(self):
+        url = reverse('autocomplete-suggestions')
+        with mock.patch('trips.views.cache') as cache:
+            response = self.client.get(url, {'field': 'bad field\n', 'term': 'Pune'})
+        self.assertEqual(response.json()['results'], [])
+        cache.get.assert_not_called()
+        cache.set.assert_not_called()
+
+
+class ManagerDashboardTest(TripViewTestCase):
+    """Manager dashboard figures"""
+    roles = ['manager']
+
+    def test_manager_dashboard_cache_invalidated_on_trip_save(self):
+        url = reverse('manager-dashboard')
+
+        response = self.client.get(url)
+        self.assertEqual(response.context['active_trips'], 1)
+
+        self.trip.status = Trip.STATUS_COMPLETED
+        self.trip.save()
+
+        response = self.client.get(url)
+        self.assertEqual(response.context['active_trips'], 0)
+        self.assertEqual(response.context['completed_this_month'], 1)
+
+
+class BaseTemplateRolesTest(TestCase):
+    """Role checks in base.html read the per-request role set"""
+    def setUp(self):
+        self.user = User.objects.create_user(username='supervisor', password='password')
+        # The manager group is not the user's first group
+        self.user.groups.add(Group.objects.create(name='supervisor'))
+        self.user.groups.add(Group.objects.create(name='manager'))
+        self.client.login(username='supervisor', password='password')
+
+    def test_menu_role_checks_share_one_groups_query(self):
+        url = reverse('trip-list')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+
+        self.assertContains(response, reverse('manager-dashboard'))
+        group_queries = [q for q in ctx.captured_queries if q['sql'].startswith('SELECT "auth_group"."name"')]
+        self.assertEqual(len(group_queries), 1)
+        # Session, user, groups, count, weight total, three alert queries and
+        # the two permission lookups behind {{ perms }}
+        with self.assertNumQueries(10):
+            self.client.get(url)
+
+
+class OneActiveTripMigrationTest(TransactionTestCase):
+    """Migration 0007 refuses to add the constraint over conflicting trips"""
+    before = [('trips', '0006_trip_active_idx')]
+    after = [('trips', '0007_one_active_trip_per_vehicle')]
+
+    def setUp(self):
+        self.executor = MigrationExecutor(connection)
+        self.executor.migrate(self.before)
+        apps = self.executor.loader.project_state(self.before).apps
+        self.Trip = apps.get_model('trips', 'Trip')
+
+        user = apps.get_model('auth', 'User').objects.create(username='migrator')
+        driver = apps.get_model('drivers', 'Driver').objects.create(
+            user=user, employee_id='D001', license_number='LIC123', phone_number='1234567890'
+        )
+        vehicle = apps.get_model('fleet', 'Vehicle').objects.create(
+            registration_plate='DUP-001', make_model='Test Truck', purchase_date=timezone.now().date()
+        )
+        for trip_number, status in [('DUP-001-1', 'In Progress'), ('DUP-001-2', 'Cancelled')]:
+            self.Trip.objects.create(
+                trip_number=trip_number, driver=driver, vehicle=vehicle,
+                date=timezone.now(), status=status, created_by=user
+            )
+
+    def tearDown(self):
+        # Leave the schema fully migrated for the tests that follow
+        self.Trip.objects.all().delete()
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_conflicting_open_trips_stop_the_migration(self):
+        self.executor.loader.build_graph()
+        with self.assertRaisesMessage(RuntimeError, 'DUP-001: DUP-001-1, DUP-001-2'):
+            self.executor.migrate(self.after)
+
+        # Once one of them is completed the constraint goes in
+        self.Trip.objects.filter(trip_number='DUP-001-2').update(status='Completed')
+        self.executor.loader.build_graph()
+        self.executor.migrate(self.after)
@@ -4,34 +4,99 @@ Views for Trips application with permission checks
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, FormView
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
 from django.contrib.auth.decorators import login_required
+from django.views.decorators.cache import cache_control
 from django.shortcuts import render, get_object_or_404, redirect
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.contrib import messages
-from django.db import models, transaction
-from django.db.models import Q, Min, Sum
+from django.db import models, transaction, IntegrityError
+from django.db.models import Q, Count, Min, Sum, Value, DecimalField, Prefetch, Exists, OuterRef
+from django.db.models.functions import Coalesce
 from django.utils import timezone
-from datetime import datetime, timedelta
-
-from .models import Trip, TripExpense
+from django.utils.functional import cached_property
+from django.core.cache import cache
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+import hashlib
+
+from .models import (
+    Trip, TripExpense, ACTIVE_TRIP_EXISTS_MESSAGE, revenue_expression,
+    autocomplete_cache_version, dashboard_cache_key, DASHBOARD_CACHE_TIMEOUT,
+)
 from .forms import TripForm, TripStatusForm, TripExpenseUpdateForm, TripCustomExpenseForm, TripExpenseFormSet
-from fleet.models import Vehicle
+from fleet.models import Vehicle, MaintenanceLog
 from ledger.models import FinancialRecord, TransactionCategory
 
 
+def pk_url_pattern(name):
+    """
+    Reverse a <int:pk> route once and return it as a format string,
+    so per-row URLs in list views can be built with .format(pk=...)
+    """
+    return reverse(name, kwargs={'pk': 0}).replace('/0/', '/{pk}/')
+
+
+@lru_cache(maxsize=256)
+def trip_search_predicate(search):
+    """
+    Q for the trip list search box. Repeated terms reuse the same tree instead
+    of rebuilding it per request; filter() never mutates the Q it is given.
+    """
+    return (
+        Q(trip_number__icontains=search) |
+        Q(party__name__icontains=search) |
+        Q(pickup_location__icontains=search) |
+        Q(delivery_location__icontains=search) |
+        Q(vehicle__registration_plate__icontains=search)
+    )
+
+
+def local_day_start(day):
+    """
+    Aware datetime for midnight at the start of `day` in the current time zone.
+    Filtering Trip.date against [day_start, next_day_start) compares the raw
+    column, so the date index can be used, unlike date__date lookups.
+    """
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def breaks_one_active_trip_rule(trip):
+    """
+    Whether trip, as the form was about to save it, would be a second
+    uncompleted trip on its vehicle. Used to tell a one_active_trip_per_vehicle
+    violation apart from any other IntegrityError once the save has failed.
+    """
+    if trip.status == Trip.STATUS_COMPLETED or trip.vehicle_id is None:
+        return False
+    return Trip.objects.filter(vehicle_id=trip.vehicle_id).exclude(
+        status=Trip.STATUS_COMPLETED
+    ).exclude(pk=trip.pk).exists()
+
+
+def trip_cursor(trip):
+    """Keyset pagination cursor pointing just past this trip"""
+    return f'{trip.date.isoformat()},{trip.created_at.isoformat()},{trip.pk}'
+
+
+def parse_trip_cursor(cursor):
+    """Inverse of trip_cursor; raises ValueError for malformed input"""
+    trip_date, created_at, pk = cursor.split(',')
+    return datetime.fromisoformat(trip_date), datetime.fromisoformat(created_at), int(pk)
+
+
 class BaseTripPermissionMixin:
     """Base mixin for trip permissions"""
     
     def has_manager_permission(self):
         """Check if user is in manager group"""
-        return self.request.user.groups.filter(name='manager').exists()
+        return 'manager' in self.request.user_roles
     
     def has_supervisor_permission(self):
         """Check if user is in supervisor group"""
-        return self.request.user.groups.filter(name='supervisor').exists()
+        return 'supervisor' in self.request.user_roles
     
     def has_driver_permission(self):
         """Check if user is in driver group"""
-        return self.request.user.groups.filter(name='driver').exists()
+        return 'driver' in self.request.user_roles
     
     def get_queryset_for_user(self):
         """Filter trips based on user permissions"""
@@ -41,12 +106,15 @@ class BaseTripPermissionMixin:
         if user.is_superuser:
             return Trip.objects.all()
         
+        # One lookup of the request's role set for every check below
+        roles = self.request.user_roles
+        
         # Manager and supervisor can see all trips
-        if self.has_manager_permission() or self.has_supervisor_permission():
+        if 'manager' in roles or 'supervisor' in roles:
             return Trip.objects.all()
         
         # Driver can only see their own trips
-        if self.has_driver_permission():
+        if 'driver' in roles:
             return Trip.objects.filter(driver=user)
         
         # Default: no trips
@@ -61,38 +129,39 @@ class TripListView(LoginRequiredMixin, BaseTripPermissionMixin, ListView):
     template_name = 'trips/trip_list.html'
     context_object_name = 'trips'
     paginate_by = 25
+    # The default ordering, made strict with a pk tiebreak so that keyset
+    # pagination can resume exactly after the last row of a page
+    keyset_ordering = ('-date', '-created_at', '-pk')
     
     def get_queryset(self):
         """Filter and sort trips based on user input and permissions"""
-        queryset = self.get_queryset_for_user().select_related('vehicle', 'party', 'driver')
+        # Notes are not shown on the list, so don't pull the TextField for every row
+        queryset = self.get_queryset_for_user().select_related('vehicle', 'party', 'driver').defer('notes')
         
-        # Search functionality
-        search = self.request.GET.get('search')
-        if search:
-            queryset = queryset.filter(
-                Q(trip_number__icontains=search) |
-                Q(party__name__icontains=search) |
-                Q(pickup_location__icontains=search) |
-                Q(delivery_location__icontains=search) |
-                Q(vehicle__registration_plate__icontains=search)
-            ).distinct()
-        
-        # Status filter
+        # Status filter first: a cheap indexed equality that narrows the
+        # rows the search's icontains predicates have to run against
         status = self.request.GET.get('status')
-        if status:
+        if status and status.isdigit():
             queryset = queryset.filter(status=status)
+        
+        # Search functionality. Party and vehicle are to-one joins, so a trip
+        # can only match once and no DISTINCT pass is needed.
+        search = self.request.GET.get('search')
+        if search:
+            queryset = queryset.filter(trip_search_predicate(search))
             
         # Date range filtering
         start_date = self.request.GET.get('start_date')
         end_date = self.request.GET.get('end_date')
         if start_date:
             try:
-                queryset = queryset.filter(date__date__gte=start_date)
+                queryset = queryset.filter(date__gte=local_day_start(date.fromisoformat(start_date)))
             except (ValueError, TypeError):
                 pass
         if end_date:
             try:
-                queryset = queryset.filter(date__date__lte=end_date)
+                next_day = date.fromisoformat(end_date) + timedelta(days=1)
+                queryset = queryset.filter(date__lt=local_day_start(next_day))
             except (ValueError, TypeError):
                 pass
 
@@ -106,21 +175,51 @@ class TripListView(LoginRequiredMixin, BaseTripPermissionMixin, ListView):
             '-trip_number': '-trip_number',
             'weight': 'weight',
             '-weight': '-weight',
-            'revenue': 'revenue_calculated', # We'll need annotation for this if we want to sort by it
+            'revenue': 'revenue_calculated',
+            '-revenue': '-revenue_calculated',
         }
         
         if sort == 'revenue' or sort == '-revenue':
-            queryset = queryset.annotate(
-                revenue_calculated=F('weight') * F('rate_per_ton')
-            )
+            # Computed in SQL so sorting never touches Trip.revenue per row
+            queryset = queryset.annotate(revenue_calculated=revenue_expression())
             
-        if sort in sort_mapping:
-            queryset = queryset.order_by(sort_mapping[sort], '-created_at')
+        self.use_keyset = sort == '-date' or sort not in sort_mapping
+        if self.use_keyset:
+            queryset = queryset.order_by(*self.keyset_ordering)
         else:
-            queryset = queryset.order_by('-date', '-created_at')
+            queryset = queryset.order_by(sort_mapping[sort], '-created_at')
             
         return queryset
     
+    def paginate_queryset(self, queryset, page_size):
+        """
+        OFFSET pagination makes the database walk every skipped row, so deep
+        pages get slower. On the default ordering, a ?cursor= (the last row of
+        the previous page) resumes from the date index instead. Other sorts,
+        and the numbered page links, use regular page-number pagination.
+        """
+        self.next_cursor = None
+        cursor = self.request.GET.get('cursor')
+        if self.use_keyset and cursor:
+            try:
+                trip_date, created_at, pk = parse_trip_cursor(cursor)
+            except ValueError:
+                pass
+            else:
+                rows = list(queryset.filter(
+                    Q(date__lt=trip_date) |
+                    Q(date=trip_date, created_at__lt=created_at) |
+                    Q(date=trip_date, created_at=created_at, pk__lt=pk)
+                )[:page_size + 1])
+                if len(rows) > page_size:
+                    self.next_cursor = trip_cursor(rows[page_size - 1])
+                return (None, None, rows[:page_size], True)
+        
+        paginator, page, object_list, is_paginated = super().paginate_queryset(queryset, page_size)
+        if self.use_keyset and page.has_next():
+            self.next_cursor = trip_cursor(list(object_list)[-1])
+        return (paginator, page, object_list, is_paginated)
+    
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['status_choices'] = Trip.STATUS_CHOICES
@@ -130,10 +229,37 @@ class TripListView(LoginRequiredMixin, BaseTripPermissionMixin, ListView):
         context['end_date'] = self.request.GET.get('end_date', '')
         context['current_sort'] = self.request.GET.get('sort', '-date')
         
-        # Summary for the filtered queryset (all pages)
-        queryset = self.get_queryset()
-        context['total_weight'] = queryset.aggregate(Sum('weight'))['weight__sum'] or 0
-        context['total_count'] = queryset.count()
+        # Reverse the per-row routes once instead of for every trip in the template
+        detail_url = pk_url_pattern('trip-detail')
+        update_url = pk_url_pattern('trip-update')
+        delete_url = pk_url_pattern('trip-delete')
+        status_url = pk_url_pattern('trip-status-update')
+        for trip in context['trips']:
+            trip.detail_url = detail_url.format(pk=trip.pk)
+            trip.update_url = update_url.format(pk=trip.pk)
+            trip.delete_url = delete_url.format(pk=trip.pk)
+            trip.status_url = status_url.format(pk=trip.pk)
+        
+        # Next/first page links; page and cursor are dropped so the other filters carry over
+        query = self.request.GET.copy()
+        query.pop('page', None)
+        query.pop('cursor', None)
+        context['first_page_query'] = query.urlencode()
+        if self.next_cursor:
+            query['cursor'] = self.next_cursor
+            context['next_cursor_query'] = query.urlencode()
+        
+        # Summary for the filtered queryset (all pages). object_list is the
+        # queryset get() already built. The paginator (if any) has counted it;
+        # on cursor pages the count rides along with the weight sum.
+        total_weight = Coalesce(Sum('weight'), Value(0, output_field=DecimalField()))
+        if context['paginator'] is not None:
+            context['total_count'] = context['paginator'].count
+            context['total_weight'] = self.object_list.aggregate(total_weight=total_weight)['total_weight']
+        else:
+            totals = self.object_list.aggregate(total_count=Count('pk'), total_weight=total_weight)
+            context['total_count'] = totals['total_count']
+            context['total_weight'] = totals['total_weight']
         
         return context
 
@@ -148,7 +274,15 @@ class TripDetailView(LoginRequiredMixin, BaseTripPermissionMixin, DetailView):
     
     def get_queryset(self):
         """Ensure user has permission to view this trip"""
-        return self.get_queryset_for_user()
+        # The expenses card only shows name and amount; trip_id is needed
+        # to attach the prefetched rows back to the trip
+        return self.get_queryset_for_user().select_related(
+            'vehicle', 'party', 'driver__user', 'created_by'
+        ).prefetch_related(
+            Prefetch('custom_expenses', queryset=TripExpense.objects.only('trip_id', 'name', 'amount')),
+            'payment_allocations__financial_record',
+            'financial_records',
+        )
 
 
 from django.db import models, transaction
@@ -185,11 +319,19 @@ class TripMapView(LoginRequiredMixin, BaseTripPermissionMixin, ListView):
             self.end_date = today
 
         queryset = queryset.filter(
-            date__date__range=[self.start_date, self.end_date],
+            date__gte=local_day_start(self.start_date),
+            date__lt=local_day_start(self.end_date + timedelta(days=1)),
             pickup_lat__isnull=False,
             pickup_lng__isnull=False,
             delivery_lat__isnull=False,
             delivery_lng__isnull=False
+        ).values(
+            # Only what the map markers need, as plain dicts rather than model instances
+            'pk', 'trip_number', 'date',
+            'pickup_lat', 'pickup_lng', 'delivery_lat', 'delivery_lng',
+            'pickup_location', 'delivery_location',
+            'vehicle__registration_plate', 'driver_id', 'driver__employee_id',
+            'driver__user__username', 'driver__user__first_name', 'driver__user__last_name',
         )
             
         return queryset
@@ -200,18 +342,27 @@ class TripMapView(LoginRequiredMixin, BaseTripPermissionMixin, ListView):
         context['end_date'] = self.end_date
         
         # Serialize trip data for JS
+        detail_url = pk_url_pattern('trip-detail')
         trips_data = []
         for trip in context['trips']:
+            if trip['driver_id']:
+                # Same format as Driver.__str__
+                full_name = f"{trip['driver__user__first_name']} {trip['driver__user__last_name']}".strip()
+                driver = full_name or trip['driver__user__username']
+                if trip['driver__employee_id']:
+                    driver = f"{driver} ({trip['driver__employee_id']})"
+            else:
+                driver = 'Unassigned'
             trips_data.append({
-                'trip_number': trip.trip_number,
-                'vehicle': trip.vehicle.registration_plate,
-                'driver': str(trip.driver) if trip.driver else 'Unassigned',
-                'date': trip.date.strftime('%Y-%m-%d'),
-                'start': [float(trip.pickup_lat), float(trip.pickup_lng)],
-                'end': [float(trip.delivery_lat), float(trip.delivery_lng)],
-                'pickup_name': trip.pickup_location,
-                'delivery_name': trip.delivery_location,
-                'url': str(reverse_lazy('trip-detail', kwargs={'pk': trip.pk}))
+                'trip_number': trip['trip_number'],
+                'vehicle': trip['vehicle__registration_plate'],
+                'driver': driver,
+                'date': trip['date'].strftime('%Y-%m-%d'),
+                'start': [float(trip['pickup_lat']), float(trip['pickup_lng'])],
+                'end': [float(trip['delivery_lat']), float(trip['delivery_lng'])],
+                'pickup_name': trip['pickup_location'],
+                'delivery_name': trip['delivery_location'],
+                'url': detail_url.format(pk=trip['pk'])
             })
         context['trips_json'] = trips_data
         return context
@@ -239,42 +390,48 @@ class TripCreateView(LoginRequiredMixin, PermissionRequiredMixin, CreateView):
         expense_formset = context['expense_formset']
         
         if expense_formset.is_valid():
-            with transaction.atomic():
-                # Set created_by and date fields
-                form.instance.created_by = self.request.user
+            try:
+                with transaction.atomic():
+                    # Set created_by and date fields
+                    form.instance.created_by = self.request.user
                 
-                # Set date from GET param if available, else today
-                date_str = self.request.GET.get('date')
-                if date_str:
-                    try:
-                        trip_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-                        current_time = timezone.now().time()
-                        form.instance.date = datetime.combine(trip_date, current_time)
-                    except ValueError:
+                    # Set date from GET param if available, else today
+                    date_str = self.request.GET.get('date')
+                    if date_str:
+                        try:
+                            trip_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+                            current_time = timezone.now().time()
+                            form.instance.date = datetime.combine(trip_date, current_time)
+                        except ValueError:
+                            form.instance.date = timezone.now()
+                    else:
                         form.instance.date = timezone.now()
-                else:
-                    form.instance.date = timezone.now()
 
-                self.object = form.save()
+                    self.object = form.save()
                 
-                # Manually save the formset to handle potential duplicates created by Trip.save()
-                instances = expense_formset.save(commit=False)
-                for instance in instances:
-                    instance.trip = self.object
-                    # Use update_or_create to handle records like 'Toll' or 'Diesel'
-                    # which might have been created in Trip.save()
-                    TripExpense.objects.update_or_create(
-                        trip=instance.trip,
-                        name=instance.name,
-                        defaults={
-                            'amount': instance.amount,
-                            'notes': instance.notes
-                        }
-                    )
+                    # Manually save the formset to handle potential duplicates created by Trip.save()
+                    instances = expense_formset.save(commit=False)
+                    for instance in instances:
+                        instance.trip = self.object
+                        # Use update_or_create to handle records like 'Toll' or 'Diesel'
+                        # which might have been created in Trip.save()
+                        TripExpense.objects.update_or_create(
+                            trip=instance.trip,
+                            name=instance.name,
+                            defaults={
+                                'amount': instance.amount,
+                                'notes': instance.notes
+                            }
+                        )
                 
-                # Handle deletions
-                for obj in expense_formset.deleted_objects:
-                    obj.delete()
+                    # Handle deletions
+                    for obj in expense_formset.deleted_objects:
+                        obj.delete()
+            except IntegrityError:
+                if not breaks_one_active_trip_rule(form.instance):
+                    raise
+                form.add_error('vehicle', ACTIVE_TRIP_EXISTS_MESSAGE)
+                return self.render_to_response(self.get_context_data(form=form))
                 
             messages.success(self.request, 'Trip and expenses created successfully!')
             return redirect(self.get_success_url())
@@ -307,25 +464,31 @@ class TripUpdateView(LoginRequiredMixin, PermissionRequiredMixin, UpdateView):
         expense_formset = context['expense_formset']
         
         if expense_formset.is_valid():
-            with transaction.atomic():
-                self.object = form.save()
+            try:
+                with transaction.atomic():
+                    self.object = form.save()
                 
-                # Manually save the formset with update_or_create logic
-                instances = expense_formset.save(commit=False)
-                for instance in instances:
-                    instance.trip = self.object
-                    TripExpense.objects.update_or_create(
-                        trip=instance.trip,
-                        name=instance.name,
-                        defaults={
-                            'amount': instance.amount,
-                            'notes': instance.notes
-                        }
-                    )
+                    # Manually save the formset with update_or_create logic
+                    instances = expense_formset.save(commit=False)
+                    for instance in instances:
+                        instance.trip = self.object
+                        TripExpense.objects.update_or_create(
+                            trip=instance.trip,
+                            name=instance.name,
+                            defaults={
+                                'amount': instance.amount,
+                                'notes': instance.notes
+                            }
+                        )
                 
-                # Handle deletions
-                for obj in expense_formset.deleted_objects:
-                    obj.delete()
+                    # Handle deletions
+                    for obj in expense_formset.deleted_objects:
+                        obj.delete()
+            except IntegrityError:
+                if not breaks_one_active_trip_rule(form.instance):
+                    raise
+                form.add_error('vehicle', ACTIVE_TRIP_EXISTS_MESSAGE)
+                return self.render_to_response(self.get_context_data(form=form))
                     
             messages.success(self.request, 'Trip and expenses updated successfully!')
             return redirect(self.get_success_url())
@@ -347,15 +510,13 @@ class TripExpenseManageView(LoginRequiredMixin, PermissionRequiredMixin, UpdateV
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        if self.request.POST:
-            context['expense_formset'] = TripExpenseFormSet(self.request.POST, instance=self.object, prefix='custom_expenses')
-        else:
+        if 'expense_formset' not in context:
             context['expense_formset'] = TripExpenseFormSet(instance=self.object, prefix='custom_expenses')
         return context
     
     def form_valid(self, form):
-        context = self.get_context_data()
-        expense_formset = context['expense_formset']
+        # Bound once; an invalid formset is re-rendered as is, with its errors
+        expense_formset = TripExpenseFormSet(self.request.POST, instance=self.object, prefix='custom_expenses')
         
         if expense_formset.is_valid():
             with transaction.atomic():
@@ -363,7 +524,7 @@ class TripExpenseManageView(LoginRequiredMixin, PermissionRequiredMixin, UpdateV
             messages.success(self.request, 'Trip expenses updated successfully!')
             return redirect(self.get_success_url())
         else:
-            return self.render_to_response(self.get_context_data(form=form))
+            return self.render_to_response(self.get_context_data(form=form, expense_formset=expense_formset))
 
     def get_success_url(self):
         return reverse_lazy('trip-detail', kwargs={'pk': self.object.pk})
@@ -392,45 +553,54 @@ class TripExpenseUpdateView(LoginRequiredMixin, PermissionRequiredMixin, FormVie
     template_name = 'trips/trip_expense_form.html'
     form_class = TripExpenseUpdateForm
     permission_required = 'trips.change_trip'
-    
+
+    @cached_property
+    def trip(self):
+        # Fetched once for get_initial, get_context_data and form_valid, and
+        # only after the login/permission checks have passed
+        return get_object_or_404(Trip, pk=self.kwargs['pk'])
+
     def get_initial(self):
-        trip = get_object_or_404(Trip, pk=self.kwargs['pk'])
         initial = {}
-        diesel = TripExpense.objects.filter(trip=trip, name='Diesel').first()
-        if diesel:
-            initial['diesel_expense'] = diesel.amount
-        toll = TripExpense.objects.filter(trip=trip, name='Toll').first()
-        if toll:
-            initial['toll_expense'] = toll.amount
+        amounts = dict(
+            TripExpense.objects.filter(
+                trip=self.trip, name__in=['Diesel', 'Toll']
+            ).values_list('name', 'amount')
+        )
+        if 'Diesel' in amounts:
+            initial['diesel_expense'] = amounts['Diesel']
+        if 'Toll' in amounts:
+            initial['toll_expense'] = amounts['Toll']
         return initial
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['trip'] = get_object_or_404(Trip, pk=self.kwargs['pk'])
+        context['trip'] = self.trip
         return context
 
     def form_valid(self, form):
-        trip = get_object_or_404(Trip, pk=self.kwargs['pk'])
+        trip = self.trip
         diesel_amount = form.cleaned_data.get('diesel_expense') or 0
         toll_amount = form.cleaned_data.get('toll_expense') or 0
 
-        # Update or create Diesel
-        TripExpense.objects.update_or_create(
-            trip=trip,
-            name='Diesel',
-            defaults={'amount': diesel_amount}
-        )
-        
-        # Explicitly update Trip fields as well
-        trip.diesel_total_cost = diesel_amount
-        trip.save(update_fields=['diesel_total_cost'])
-
-        # Update or create Toll
-        TripExpense.objects.update_or_create(
-            trip=trip,
-            name='Toll',
-            defaults={'amount': toll_amount}
-        )
+        with transaction.atomic():
+            # Upsert Diesel and Toll in one INSERT ... ON CONFLICT on (trip, name)
+            TripExpense.objects.bulk_create(
+                [
+                    TripExpense(trip=trip, name='Diesel', amount=diesel_amount),
+                    TripExpense(trip=trip, name='Toll', amount=toll_amount),
+                ],
+                update_conflicts=True,
+                unique_fields=['trip', 'name'],
+                update_fields=['amount'],
+            )
+
+            # bulk_create skips TripExpense.save(), so sync the Trip explicitly.
+            # Trip.save() would re-upsert the Diesel expense written above; only
+            # the cost column and the fuel log derived from it need updating.
+            Trip.objects.filter(pk=trip.pk).update(diesel_total_cost=diesel_amount)
+            trip.diesel_total_cost = diesel_amount
+            trip.sync_fuel_log()
 
         messages.success(self.request, 'Trip expenses updated successfully!')
         return redirect('trip-detail', pk=trip.pk)
@@ -445,14 +615,17 @@ class TripCustomExpenseCreateView(LoginRequiredMixin, PermissionRequiredMixin, C
     template_name = 'trips/trip_custom_expense_form.html'
     permission_required = 'trips.change_trip'
     
-    def dispatch(self, request, *args, **kwargs):
-        self.trip = get_object_or_404(Trip, pk=kwargs['trip_pk'])
-        return super().dispatch(request, *args, **kwargs)
+    @cached_property
+    def trip(self):
+        return get_object_or_404(Trip, pk=self.kwargs['trip_pk'])
     
     def form_valid(self, form):
         form.instance.trip = self.trip
+        # A 'Diesel' expense also writes back to the trip; commit both together
+        with transaction.atomic():
+            response = super().form_valid(form)
         messages.success(self.request, 'Expense added successfully!')
-        return super().form_valid(form)
+        return response
     
     def get_success_url(self):
         return reverse_lazy('trip-detail', kwargs={'pk': self.trip.pk})
@@ -503,9 +676,9 @@ def update_trip_status(request, pk):
     trip = get_object_or_404(Trip, pk=pk)
     
     # Permission checks
-    is_driver = request.user.groups.filter(name='driver').exists()
-    is_supervisor = request.user.groups.filter(name='supervisor').exists()
-    is_manager = request.user.groups.filter(name='manager').exists()
+    is_driver = 'driver' in request.user_roles
+    is_supervisor = 'supervisor' in request.user_roles
+    is_manager = 'manager' in request.user_roles
     is_admin = request.user.is_superuser
     
     # Check if user can update this trip's status
@@ -521,18 +694,29 @@ def update_trip_status(request, pk):
         return redirect('trip-detail', pk=pk)
     
     if request.method == 'POST':
-        # Get the status from DB before the form binds and changes it
-        old_status = Trip.objects.get(pk=pk).status
         form = TripStatusForm(request.POST, instance=trip)
         
         if form.is_valid():
             new_status = form.cleaned_data.get('status')
-            form.save()
+            try:
+                with transaction.atomic():
+                    # Lock the row so concurrent status changes apply one at a
+                    # time, and read the status it had before this one
+                    old_status = Trip.objects.select_for_update().values_list(
+                        'status', flat=True
+                    ).get(pk=pk)
+                    # Only write the status columns, not the whole row
+                    trip = form.save(commit=False)
+                    trip.save(update_fields=['status', 'actual_completion_datetime'])
+            except IntegrityError:
+                # Reopening a trip while the vehicle already has an uncompleted one
+                messages.error(request, ACTIVE_TRIP_EXISTS_MESSAGE)
+                return redirect('trip-detail', pk=pk)
             
             if old_status != new_status:
                 messages.success(
                     request,
-                    f'Trip status updated from "{old_status}" to "{new_status}" successfully!'
+                    f'Trip status updated from "{Trip.Status(old_status).label}" to "{Trip.Status(new_status).label}" successfully!'
                 )
 
             # Redirect to referer if available, else to detail page
@@ -545,85 +729,107 @@ def update_trip_status(request, pk):
     return redirect('trip-detail', pk=pk)
 
 
-@login_required
-def manager_dashboard(request):
+def manager_dashboard_context(now):
     """
-    Manager dashboard - shows system overview
+    Figures shown on the manager dashboard as of now (a local datetime), which
+    is read once by the caller so every figure uses the same month and day
     """
-    # Check if user is manager or admin
-    if not (request.user.is_superuser or 
-            request.user.groups.filter(name='manager').exists()):
-        messages.error(request, 'Access denied. Manager dashboard is only for managers.')
-        return redirect('trip-list')
-    
-    # Active trips
-    active_trips = Trip.objects.filter(
-        status=Trip.STATUS_IN_PROGRESS
-    ).count()
-    
-    # Completed trips this month
-    current_month = timezone.now().month
-    current_year = timezone.now().year
-    
-    completed_this_month = Trip.objects.filter(
-        status=Trip.STATUS_COMPLETED,
-        actual_completion_datetime__month=current_month,
-        actual_completion_datetime__year=current_year
-    ).count()
-    
-    # Vehicles due for maintenance (next service due within 7 days)
-    seven_days_later = timezone.now().date() + timedelta(days=7)
-    
-    vehicles_due_maintenance = Vehicle.objects.filter(
-        maintenance_logs__next_service_due__lte=seven_days_later
-    ).distinct().count()
-    
-    # Recent financial summary
-    # 1. Cash Income this month (Excluding Accruals/Invoices)
-    income_this_month = FinancialRecord.objects.filter(
-        category__type=TransactionCategory.TYPE_INCOME,
-        date__month=current_month,
-        date__year=current_year
-    ).exclude(
-        record_type=FinancialRecord.RECORD_TYPE_INVOICE
-    ).aggregate(total=models.Sum('amount'))['total'] or 0
-    
-    # 2. Expenses this month (Excluding Deductions which only reduce receivable)
-    expenses_this_month = FinancialRecord.objects.filter(
-        category__type=TransactionCategory.TYPE_EXPENSE,
-        date__month=current_month,
-        date__year=current_year
-    ).exclude(
-        category__name='Deductions'
-    ).aggregate(total=models.Sum('amount'))['total'] or 0
+    today = now.date()
+    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    next_month_start = (month_start + timedelta(days=32)).replace(day=1)
+    
+    # Trip counts in one query: active trips, and trips completed this month.
+    # The month is a half-open range so the filter compares the raw column
+    # instead of extracting month/year.
+    trip_counts = Trip.objects.aggregate(
+        active=Count('pk', filter=Q(status=Trip.STATUS_IN_PROGRESS)),
+        completed_this_month=Count('pk', filter=Q(
+            status=Trip.STATUS_COMPLETED,
+            actual_completion_datetime__gte=month_start,
+            actual_completion_datetime__lt=next_month_start
+        )),
+    )
+    
+    # Vehicle counts in one query: in maintenance, and due for maintenance
+    # (next service due within 7 days). Exists checks each vehicle's logs
+    # without joining them in, so no vehicle is counted twice.
+    seven_days_later = today + timedelta(days=7)
+    due_logs = MaintenanceLog.objects.filter(
+        vehicle=OuterRef('pk'),
+        next_service_due__lte=seven_days_later
+    )
+    
+    vehicle_counts = Vehicle.objects.aggregate(
+        in_maintenance=Count('pk', filter=Q(status=Vehicle.STATUS_MAINTENANCE)),
+        due_maintenance=Count('pk', filter=Q(Exists(due_logs))),
+    )
+    
+    # Recent financial summary, both totals from a single pass over the month
+    financial_totals = FinancialRecord.objects.filter(
+        date__gte=month_start.date(),
+        date__lt=next_month_start.date()
+    ).aggregate(
+        # 1. Cash Income this month (Excluding Accruals/Invoices)
+        income=models.Sum('amount', filter=(
+            Q(category__type=TransactionCategory.TYPE_INCOME) &
+            ~Q(record_type=FinancialRecord.RECORD_TYPE_INVOICE)
+        )),
+        # 2. Expenses this month (Excluding Deductions which only reduce receivable)
+        expenses=models.Sum('amount', filter=(
+            Q(category__type=TransactionCategory.TYPE_EXPENSE) &
+            ~Q(category__name='Deductions')
+        )),
+    )
+    income_this_month = financial_totals['income'] or 0
+    expenses_this_month = financial_totals['expenses'] or 0
 
     # Calculate GST portion of income (from Final Bills)
     from ledger.models import Bill
     gst_this_month = sum(bill.gst_amount for bill in Bill.objects.filter(
         status=Bill.STATUS_FINAL,
-        date__month=current_month,
-        date__year=current_year
+        date__gte=month_start.date(),
+        date__lt=next_month_start.date()
     ))
     
-    # Recent trips
-    recent_trips = Trip.objects.order_by('-created_at')[:10]
-    
-    # Vehicles in maintenance
-    vehicles_in_maintenance = Vehicle.objects.filter(
-        status=Vehicle.STATUS_MAINTENANCE
-    ).count()
-    
-    context = {
-        'active_trips': active_trips,
-        'completed_this_month': completed_this_month,
-        'vehicles_due_maintenance': vehicles_due_maintenance,
+    # Recent trips, loading only the columns the table shows
+    recent_trips = Trip.objects.select_related('driver__user', 'vehicle').only(
+        'trip_number', 'status', 'date', 'created_at',
+        'driver__user__username', 'driver__user__first_name', 'driver__user__last_name',
+        'vehicle__registration_plate',
+    ).order_by('-created_at')[:10]
+    
+    return {
+        'active_trips': trip_counts['active'],
+        'completed_this_month': trip_counts['completed_this_month'],
+        'vehicles_due_maintenance': vehicle_counts['due_maintenance'],
         'income_this_month': income_this_month,
         'expenses_this_month': expenses_this_month,
         'net_profit_incl_gst': income_this_month - expenses_this_month,
         'net_profit_excl_gst': (income_this_month - gst_this_month) - expenses_this_month,
-        'recent_trips': recent_trips,
-        'vehicles_in_maintenance': vehicles_in_maintenance,
+        # Evaluated here so the cached copy holds the rows, not the query
+        'recent_trips': list(recent_trips),
+        'vehicles_in_maintenance': vehicle_counts['in_maintenance'],
     }
+
+
+@login_required
+def manager_dashboard(request):
+    """
+    Manager dashboard - shows system overview
+    """
+    # Check if user is manager or admin
+    if not (request.user.is_superuser or 'manager' in request.user_roles):
+        messages.error(request, 'Access denied. Manager dashboard is only for managers.')
+        return redirect('trip-list')
+    
+    # The figures are the same for every manager and change slowly, so they
+    # are cached per month and dropped whenever a summarised model changes
+    now = timezone.localtime()
+    cache_key = dashboard_cache_key(now)
+    context = cache.get(cache_key)
+    if context is None:
+        context = manager_dashboard_context(now)
+        cache.set(cache_key, context, DASHBOARD_CACHE_TIMEOUT)
     
     return render(request, 'trips/manager_dashboard.html', context)
 
@@ -634,7 +840,21 @@ from django.http import JsonResponse
 from fleet.models import Vehicle, Tyre
 
 
+# Suggestions are also invalidated on any trip/expense change; the timeout
+# bounds staleness for the tyre fields, which don't bump the version
+AUTOCOMPLETE_CACHE_TIMEOUT = 300
+
+# Compact separators and raw UTF-8 (no \uXXXX escapes) keep the payload small
+AUTOCOMPLETE_JSON_PARAMS = {'separators': (',', ':'), 'ensure_ascii': False}
+
+# Fields the endpoint can suggest for; anything else gets no results
+AUTOCOMPLETE_FIELDS = frozenset([
+    'pickup_location', 'delivery_location', 'expense_name', 'tyre_brand', 'tyre_size',
+])
+
+
 @login_required
+@cache_control(private=True, max_age=60)
 def get_autocomplete_suggestions(request):
     """
     Returns suggestions for Select2.
@@ -644,6 +864,18 @@ def get_autocomplete_suggestions(request):
     field = request.GET.get('field') # 'pickup_location' or 'delivery_location'
     term = request.GET.get('term', '') # Select2 uses 'term' for the search query
     
+    # Unknown fields never reach the cache, so they can't put odd keys in it
+    if field not in AUTOCOMPLETE_FIELDS:
+        return JsonResponse({'results': []}, json_dumps_params=AUTOCOMPLETE_JSON_PARAMS)
+    
+    # Every keystroke hits this view, so repeated prefixes are served from cache.
+    # The term is hashed to keep arbitrary user input out of the cache key.
+    term_hash = hashlib.md5(term.lower().encode()).hexdigest()
+    cache_key = f'autocomplete:{autocomplete_cache_version()}:{field}:{term_hash}'
+    results = cache.get(cache_key)
+    if results is not None:
+        return JsonResponse({'results': results}, json_dumps_params=AUTOCOMPLETE_JSON_PARAMS)
+    
     results = []
     
     # 1. Handle Location Fields (Pickup/Delivery)
@@ -666,7 +898,9 @@ def get_autocomplete_suggestions(request):
 
     # 2. Handle Other Fields (Legacy support)
     elif field == 'expense_name':
-        qs = TripExpense.objects.filter(name__icontains=term).values_list('name', flat=True).distinct()[:10]
+        # order_by('name') replaces the model's created_at ordering, which
+        # would otherwise be part of the DISTINCT and repeat names
+        qs = TripExpense.objects.filter(name__icontains=term).values_list('name', flat=True).distinct().order_by('name')[:10]
         results = [{'id': x, 'text': x} for x in qs]
     elif field == 'tyre_brand':
         qs = Tyre.objects.filter(brand__icontains=term).values_list('brand', flat=True).distinct()[:10]
@@ -674,5 +908,6 @@ def get_autocomplete_suggestions(request):
     elif field == 'tyre_size':
         qs = Tyre.objects.filter(size__icontains=term).values_list('size', flat=True).distinct()[:10]
         results = [{'id': x, 'text': x} for x in qs]
-        
-    return JsonResponse({'results': results})
+    
+    cache.set(cache_key, results, AUTOCOMPLETE_CACHE_TIMEOUT)
+    return JsonResponse({'results': results}, json_dumps_params=AUTOCOMPLETE_JSON_PARAMS)